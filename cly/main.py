@@ -1,6 +1,4 @@
 import sys
-import inspect
-import argparse
 
 class cly:
     def exit(code=0):
@@ -23,69 +21,414 @@ class cly:
             cly.error(e)
 
 
+def _specialize(plan):
+    """Compile a plan into a parser specialized for one command.
+
+    The returned callable closes over the command's required-name tuple,
+    option-name set and default dict, so each invocation parses argv
+    without re-deriving anything from the plan. It handles the common
+    shapes directly: positionals in declaration order, '--name value' and
+    '--name=value'. Returns the keyword dict for the call, or None when
+    argparse is needed (help requested, unrecognized or abbreviated
+    options, dangling '--name' with no value).
+    """
+    required = tuple(name for name, is_required, _ in plan if is_required)
+    defaults = {name: default for name, is_required, default in plan if not is_required}
+    options = frozenset(defaults)
+    nreq = len(required)
+
+    if not plan:
+        def parse_no_args(argv):
+            for arg in argv:
+                if arg[:1] == '-' and arg != '-':
+                    return None
+            return {}
+        return parse_no_args
+
+    def parse(argv):
+        kw = dict(defaults)
+        npos = 0
+        i = 0
+        n = len(argv)
+        while i < n:
+            arg = argv[i]
+            if arg[:2] == '--':
+                name, eq, value = arg[2:].partition('=')
+                if name not in options:
+                    return None
+                if eq:
+                    kw[name] = value
+                else:
+                    i += 1
+                    if i >= n:
+                        return None
+                    kw[name] = argv[i]
+            elif arg[:1] == '-' and arg != '-':
+                return None
+            else:
+                if npos < nreq:
+                    kw[required[npos]] = arg
+                    npos += 1
+            i += 1
+        return kw
+
+    return parse
+
+
+_path_cache = {}
+
+
+def _split_path(path):
+    parts = _path_cache.get(path)
+    if parts is None:
+        parts = tuple(sys.intern(p) for p in path.strip('/').split('/'))
+        _path_cache[path] = parts
+    return parts
+
+
+_CO_VARARGS = 0x04
+
+
+def _plan_from_code(func):
+    """Build a dispatch plan from func.__code__ without importing inspect.
+
+    Covers plain Python functions, which is what cmd decorators see in
+    practice. Returns None for anything exotic (bound methods, partials,
+    *args) so the caller can fall back to inspect.signature.
+    """
+    if type(func) is not _FunctionType:
+        return None
+    code = func.__code__
+    if code.co_flags & _CO_VARARGS:
+        return None
+    argcount = code.co_argcount
+    kwonlycount = code.co_kwonlyargcount
+    intern = sys.intern
+    names = [intern(name) for name in code.co_varnames[:argcount + kwonlycount]]
+    defaults = func.__defaults__ or ()
+    kwdefaults = func.__kwdefaults__ or {}
+    first_default = argcount - len(defaults)
+    plan = []
+    for i in range(argcount):
+        if i >= first_default:
+            plan.append((names[i], False, defaults[i - first_default]))
+        else:
+            plan.append((names[i], True, None))
+    for i in range(argcount, argcount + kwonlycount):
+        name = names[i]
+        if name in kwdefaults:
+            plan.append((name, False, kwdefaults[name]))
+        else:
+            plan.append((name, True, None))
+    return tuple(plan)
+
+
+def _build_plan(signature):
+    import inspect
+    empty = inspect.Parameter.empty
+    var_keyword = inspect.Parameter.VAR_KEYWORD
+    return tuple(
+        (sys.intern(p.name), p.default is empty, p.default)
+        for p in signature.parameters.values()
+        if p.kind is not var_keyword
+    )
+
+
+_FunctionType = type(_build_plan)
+
+
+_LABEL_TRANS = str.maketrans('-', '_')
+
+# Per-entry lines of the generated completion tables; %-formatting avoids
+# re-parsing an f-string template for every registered node.
+_ARRAY_LINE = '_COMP_%s__%s=(%s)'
+_SUBCMDS_LINE = '    subcmds["%s"]="%s"'
+_OPTS_LINE = '    opts["%s"]="%s"'
+_VALS_LINE = '    vals["%s__%s"]="%s"'
+
+# Static scaffolding of the generated bash completion function. Only the
+# command/option tables vary per CLI, so the fixed fragments are joined
+# once at import time instead of line-by-line on every build.
+_COMPLETION_PRELUDE = """    local cur prev words cword
+    COMPREPLY=()
+    cur="${COMP_WORDS[COMP_CWORD]}"
+    prev="${COMP_WORDS[COMP_CWORD-1]}"
+    words=("${COMP_WORDS[@]}")
+    cword=$COMP_CWORD"""
+
+_COMPLETION_BODY = """
+    find_cmd_label() {
+        local idx=1
+        local curr_label=""
+        local last_label=""
+        while ((idx < cword)); do
+            local arg="${words[idx]}"
+            [[ "$arg" == --* ]] && break
+            if [[ -z "$curr_label" ]]; then
+                curr_label="$arg"
+            else
+                curr_label="${curr_label}_$arg"
+            fi
+            local normalized_curr_label="${curr_label//-/_}"
+            if [[ -n "${subcmds[$normalized_curr_label]}" ]]; then
+                last_label="$normalized_curr_label"
+            else
+                last_label="$normalized_curr_label"
+                break
+            fi
+            ((idx++))
+        done
+        echo "$last_label $idx"
+    }
+
+    if [[ $cword -eq 1 ]]; then
+        COMPREPLY=( $(compgen -W "$cmds" -- "$cur") )
+        return 0
+    fi
+
+    read sub_label argstart <<<"$(find_cmd_label)"
+
+    if [[ -z "$sub_label" ]]; then
+        sub_label="${words[1]//-/_}"
+        argstart=2
+    fi
+
+    declare -A seen_opts=()
+    idx=$argstart
+    while ((idx < cword)); do
+        word="${words[idx]}"
+        if [[ "$word" == --* ]]; then
+            argn="${word%%=*}"
+            argn="${argn#--}"
+            seen_opts["$argn"]=1
+            if [[ "$word" != *=* ]]; then
+                if ((idx + 1 < cword)); then
+                    nextw="${words[idx+1]}"
+                    if [[ ! "$nextw" == --* ]]; then
+                        ((idx++))
+                    fi
+                fi
+            fi
+        fi
+        ((idx++))
+    done
+
+    remaining_opts=()
+    for opt in ${opts[$sub_label]}; do
+        o="${opt#--}"
+        [[ -z "${seen_opts[$o]}" ]] && remaining_opts+=("$opt")
+    done
+
+    if [[ -n "${subcmds[$sub_label]}" && $cword -eq $argstart ]]; then
+        present=0
+        for sub in ${subcmds[$sub_label]}; do
+            if [[ "${words[argstart]}" == "$sub" ]]; then
+                present=1
+            fi
+        done
+        if [[ $present -eq 0 ]]; then
+            COMPREPLY=( $(compgen -W "${subcmds[$sub_label]}" -- "$cur") )
+            return 0
+        fi
+    fi
+
+    if [[ "$prev" == --* ]]; then
+        argname="${prev#--}"
+        if [[ -n "${vals[${sub_label}__${argname}]}" ]]; then
+            COMPREPLY=( $(compgen -W "${vals[${sub_label}__${argname}]}" -- "$cur") )
+            return 0
+        fi
+    fi
+
+    if [[ "$cur" == --*=* ]]; then
+        argname="${cur%%=*}"
+        argname="${argname#--}"
+        val_primary="${cur#*=}"
+        if [[ -n "${vals[${sub_label}__${argname}]}" ]]; then
+            COMPREPLY=( $(compgen -W "${vals[${sub_label}__${argname}]}" -- "$val_primary") )
+            return 0
+        fi
+    fi
+
+    if ((cword>=2)); then
+        prev2="${COMP_WORDS[COMP_CWORD-2]}"
+        if [[ "$prev2" == --* ]]; then
+            argname="${prev2#--}"
+            if [[ -n "${vals[${sub_label}__${argname}]}" ]]; then
+                if ((${#remaining_opts[@]})); then
+                    COMPREPLY=( $(compgen -W "${remaining_opts[*]}" -- "$cur") )
+                    return 0
+                fi
+            fi
+        fi
+    fi
+
+    if [[ -z "${subcmds[$sub_label]}" && ${#remaining_opts[@]} -gt 0 ]]; then
+        COMPREPLY=( $(compgen -W "${remaining_opts[*]}" -- "$cur") )
+        return 0
+    fi
+
+    if [[ ${#remaining_opts[@]} -gt 0 ]]; then
+        COMPREPLY+=( $(compgen -W "${remaining_opts[*]}" -- "$cur") )
+    fi
+
+    return 0
+}"""
+
+
 class CommandNode:
+    __slots__ = ('name', 'aliases', 'help', 'func', 'signature', 'plan',
+                 'parser', 'argparser', 'children', 'completion', '_distinct')
+
     def __init__(self, name=None, aliases=None, help_desc=""):
         self.name = name
         self.aliases = aliases if aliases is not None else []
         self.help = help_desc
         self.func = None
         self.signature = None
+        self.plan = None
+        self.parser = None
+        self.argparser = None
         self.children = dict()
         self.completion = dict()
+        self._distinct = None
+
+    def ensure_plan(self):
+        if self.plan is None and self.func is not None:
+            plan = _plan_from_code(self.func)
+            if plan is not None:
+                self.plan = plan
+                return plan
+            sig = getattr(self.func, '__signature__', None)
+            if sig is None:
+                import inspect
+                sig = inspect.signature(self.func)
+                try:
+                    self.func.__signature__ = sig
+                except (AttributeError, TypeError):
+                    pass
+            self.signature = sig
+            self.plan = _build_plan(sig)
+        return self.plan
+
+    def ensure_parser(self):
+        parser = self.parser
+        if parser is None and self.func is not None:
+            parser = _specialize(self.ensure_plan())
+            self.parser = parser
+        return parser
 
     def add_child(self, child):
         self.children[child.name] = child
         for alias in child.aliases:
             self.children[alias] = child
+        self._distinct = None
 
     def get_or_create_child(self, name, aliases=None):
-        if name not in self.children:
-            self.children[name] = CommandNode(name, aliases)
-        return self.children[name]
+        child = self.children.get(name)
+        if child is None:
+            child = CommandNode(name, aliases)
+            self.children[name] = child
+            self._distinct = None
+        return child
 
     def find_node(self, argv):
         node = self
         path = []
+        append = path.append
         idx = 0
-        while idx < len(argv):
+        n = len(argv)
+        while idx < n:
             arg = argv[idx]
-            if arg in node.children:
-                node = node.children[arg]
-                path.append(arg)
-                idx += 1
-            else:
+            child = node.children.get(arg)
+            if child is None:
                 break
+            node = child
+            append(arg)
+            idx += 1
         return node, path, argv[idx:]
 
-    def collect_recursive(self, prefix=()):
-        out = []
-        if self.func is not None:
-            out.append((prefix, self))
-        processed_children = set()
-        for name, child in self.children.items():
-            if child not in processed_children:
-                out.extend(child.collect_recursive(prefix + (child.name if child.name else name,)))
-                processed_children.add(child)
+    def distinct_children(self):
+        out = self._distinct
+        if out is None:
+            seen = set()
+            out = []
+            for child in self.children.values():
+                if child not in seen:
+                    seen.add(child)
+                    out.append(child)
+            self._distinct = out
         return out
 
+    def walk(self, prefix=()):
+        """Single DFS yielding (prefix, node, distinct children) per node.
+
+        Iterative with an explicit iterator stack and one shared prefix
+        list, so deep trees pay neither nested generator delegation nor
+        per-level tuple concatenation.
+        """
+        base = len(prefix)
+        prefix = list(prefix)
+        children = self.distinct_children()
+        yield tuple(prefix), self, children
+        stack = [iter(children)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                if len(prefix) > base:
+                    prefix.pop()
+                continue
+            prefix.append(child.name)
+            children = child.distinct_children()
+            yield tuple(prefix), child, children
+            stack.append(iter(children))
+
+    def collect_recursive(self, prefix=()):
+        return [(pfx, node) for pfx, node, _ in self.walk(prefix)
+                if node.func is not None]
+
     def collect_structure(self, prefix=()):
-        out = []
-        processed_children = set()
-        children_keys = []
-        for name, child in self.children.items():
-            if child not in processed_children:
-                children_keys.append(child.name)
-                processed_children.add(child)
-        out.append((prefix, self, sorted(children_keys)))
-        processed_children = set()
-        for name, child in self.children.items():
-            if child not in processed_children:
-                out.extend(child.collect_structure(prefix + (child.name if child.name else name,)))
-                processed_children.add(child)
-        return out
+        return [(pfx, node, sorted(child.name for child in children))
+                for pfx, node, children in self.walk(prefix)]
+
+
+def _register_cmd(root, parts, func, help_desc, completion, aliases):
+    node = root
+    for part in parts[:-1]:
+        node = node.get_or_create_child(part)
+    node.add_child(CommandNode(parts[-1], aliases, help_desc or ""))
+    cmd_node = node.children[parts[-1]]
+    cmd_node.func = func
+    cmd_node.completion = completion or {}
+    return cmd_node
+
+
+def _copy_subtree(from_node, to_node):
+    stack = [(from_node, to_node)]
+    while stack:
+        src_node, dst_node = stack.pop()
+        if src_node.func is not None:
+            dst_node.func = src_node.func
+            dst_node.help = src_node.help
+            dst_node.completion = src_node.completion
+            dst_node.signature = src_node.signature
+            dst_node.plan = src_node.plan
+            dst_node.parser = src_node.parser
+        if not dst_node.children:
+            # Nothing to merge with: adopt the group's subtrees wholesale
+            # (one C-level dict update, alias keys included) instead of
+            # rebuilding them node by node.
+            dst_node.children.update(src_node.children)
+            dst_node._distinct = None
+            continue
+        for child in src_node.distinct_children():
+            stack.append((child, dst_node.get_or_create_child(child.name, child.aliases)))
 
 
 class CLIGroup:
+    __slots__ = ('name', 'desc', 'aliases', 'prefix', 'root')
+
     def __init__(self, name='group', desc="", aliases=None, prefix=None):
         self.name = name
         self.desc = desc
@@ -99,93 +442,59 @@ class CLIGroup:
         self.root = CommandNode(name, self.aliases if not self.prefix else self.prefix, desc)
 
     def cmd(self, path, help=None, completion=None, aliases=None):
-        parts = path.strip('/').split('/')
+        parts = _split_path(path)
         def decorator(func):
-            node = self.root
-            for part in parts[:-1]:
-                node = node.get_or_create_child(part)
-            node.add_child(CommandNode(parts[-1], aliases, help or ""))
-            cmd_node = node.children[parts[-1]]
-            cmd_node.func = func
-            cmd_node.completion = completion or {}
-            cmd_node.signature = inspect.signature(func)
+            _register_cmd(self.root, parts, func, help, completion, aliases)
             return func
         return decorator
 
     def include_group(self, group, prefix=""):
-        def copy_subtree(from_node, to_node):
-            if from_node.func is not None:
-                to_node.func = from_node.func
-                to_node.help = from_node.help
-                to_node.completion = from_node.completion
-                to_node.signature = from_node.signature
-            processed_children = set()
-            for cname, child in from_node.children.items():
-                if child not in processed_children:
-                    new_child_node = to_node.get_or_create_child(child.name, child.aliases)
-                    copy_subtree(child, new_child_node)
-                    processed_children.add(child)
-
         if isinstance(prefix, str):
-            prefix_parts = [p for p in prefix.strip('/').split('/') if p]
+            prefixes = [prefix]
+        elif isinstance(prefix, list):
+            prefixes = prefix
+        else:
+            prefixes = []
+        for pref in prefixes:
             node = self.root
-            for part in prefix_parts:
+            for part in [sys.intern(p) for p in pref.strip('/').split('/') if p]:
                 node = node.get_or_create_child(part)
-            copy_subtree(group.root, node)
-        elif isinstance(prefix, list):
-            for pref in prefix:
-                prefix_parts = [p for p in pref.strip('/').split('/') if p]
-                node = self.root
-                for part in prefix_parts:
-                    node = node.get_or_create_child(part)
-                copy_subtree(group.root, node)
+            _copy_subtree(group.root, node)
 
 class CLI:
+    __slots__ = ('root', 'name', 'desc', '_completion_script', '_help_text')
+
     def __init__(self, name='cli', desc=""):
         self.root = CommandNode(name, help_desc=desc)
         self.name = name
         self.desc = desc
+        self._completion_script = None
+        self._help_text = None
 
     def cmd(self, path, help=None, completion=None, aliases=None):
-        parts = path.strip('/').split('/')
+        parts = _split_path(path)
         def decorator(func):
-            node = self.root
-            for part in parts[:-1]:
-                node = node.get_or_create_child(part)
-            node.add_child(CommandNode(parts[-1], aliases, help or ""))
-            cmd_node = node.children[parts[-1]]
-            cmd_node.func = func
-            cmd_node.completion = completion or {}
-            cmd_node.signature = inspect.signature(func)
+            _register_cmd(self.root, parts, func, help, completion, aliases)
+            self._completion_script = None
+            self._help_text = None
             return func
         return decorator
 
     def include_group(self, group, prefix=None):
         if isinstance(prefix, list):
-            prefix_parts = [p for p_list in prefix for p in p_list.strip('/').split('/') if p] if prefix else []
+            prefix_parts = [sys.intern(p) for p_list in prefix for p in p_list.strip('/').split('/') if p] if prefix else []
         elif isinstance(prefix, str):
-            prefix_parts = [p for p in prefix.strip('/').split('/') if p] if prefix else []
+            prefix_parts = [sys.intern(p) for p in prefix.strip('/').split('/') if p] if prefix else []
         else:
             prefix_parts = []
 
         node = self.root
         for part in prefix_parts:
-             node = node.get_or_create_child(part)
-
-        def copy_subtree(from_node, to_node):
-            if from_node.func is not None:
-                to_node.func = from_node.func
-                to_node.help = from_node.help
-                to_node.completion = from_node.completion
-                to_node.signature = from_node.signature
-            processed_children = set()
-            for cname, child in from_node.children.items():
-                if child not in processed_children:
-                    new_child_node = to_node.get_or_create_child(child.name, child.aliases)
-                    copy_subtree(child, new_child_node)
-                    processed_children.add(child)
-
-        copy_subtree(group.root, node)
+            node = node.get_or_create_child(part)
+
+        _copy_subtree(group.root, node)
+        self._completion_script = None
+        self._help_text = None
 
     def find_node(self, argv):
         return self.root.find_node(argv)
@@ -200,12 +509,7 @@ class CLI:
             sys.exit(1)
         node, path, remaining = self.find_node(argv)
         if node.func is None:
-            processed_children = set()
-            children_keys = []
-            for name, child in node.children.items():
-                if child not in processed_children:
-                    children_keys.append(child.name)
-                    processed_children.add(child)
+            children_keys = [child.name for child in node.distinct_children()]
             if children_keys:
                 print(f"Usage: {self.name} {' '.join(path)} <subcommand> [options]")
                 print("Subcommands:", ' '.join(sorted(children_keys)))
@@ -214,231 +518,115 @@ class CLI:
                 print(f"Unknown command: {' '.join(argv)}")
                 self.show_help()
                 sys.exit(1)
-        params = list(node.signature.parameters.values())
-        ap = argparse.ArgumentParser(prog=f"{self.name} {' '.join(path)}", add_help=True)
-        for p in params:
-            is_required = (p.default == inspect.Parameter.empty)
-            if is_required:
-                ap.add_argument(p.name)
-            else:
-                ap.add_argument(f"--{p.name}", dest=p.name, default=p.default, required=False)
-        ns, _ = ap.parse_known_args(remaining)
-        kw = {}
-        for p in params:
-            if p.default == inspect.Parameter.empty:
-                val = getattr(ns, p.name, None)
-                if val is None:
-                    print(f"Missing required argument: {p.name}")
-                    sys.exit(1)
-            else:
-                val = getattr(ns, p.name, p.default)
-            kw[p.name] = val
+        kw = node.ensure_parser()(remaining)
+        plan = node.plan
+        if kw is None:
+            ap = node.argparser
+            if ap is None:
+                import argparse
+                ap = argparse.ArgumentParser(prog=f"{self.name} {' '.join(path)}", add_help=True)
+                for name, required, default in plan:
+                    if required:
+                        ap.add_argument(name)
+                    else:
+                        ap.add_argument(f"--{name}", dest=name, default=default, required=False)
+                node.argparser = ap
+            ns, _ = ap.parse_known_args(remaining)
+            values = vars(ns)
+            kw = {}
+            for name, required, default in plan:
+                kw[name] = values.get(name, None if required else default)
+        for name, required, default in plan:
+            if required and kw.get(name) is None:
+                print(f"Missing required argument: {name}")
+                sys.exit(1)
         node.func(**kw)
 
     def show_help(self):
-        print(f"usage: {self.name} <command> [<args>]\n")
+        text = self._help_text
+        if text is None:
+            text = self._build_help_text()
+            self._help_text = text
+        print(text)
+
+    def _build_help_text(self):
+        lines = [f"usage: {self.name} <command> [<args>]\n"]
         for prefix, node, children in self.root.collect_structure():
             if prefix:
                 cmdpath = ' '.join(prefix)
                 desc = node.help if node.help else ""
                 if node.func is not None:
-                    print(f"  {cmdpath} - {desc}")
+                    lines.append(f"  {cmdpath} - {desc}")
                 if children:
-                    print(f"  {cmdpath}: subcommands: {', '.join(children)}")
+                    lines.append(f"  {cmdpath}: subcommands: {', '.join(children)}")
             else:
                 if children:
-                    print("Available commands:", ', '.join(children))
+                    lines.append(f"Available commands: {', '.join(children)}")
+        return '\n'.join(lines)
 
     def print_completion(self):
-        nodes = {}
-        for prefix, node in self.root.collect_recursive():
-            label = "_".join(prefix).replace('-', '_')
-            nodes[label] = (prefix, node)
+        script = self._completion_script
+        if script is None:
+            script = self._build_completion_script()
+            self._completion_script = script
+        print(script)
 
+    def _build_completion_script(self):
+        nodes = {}
         all_cmds = set()
         subcmds_map = {}
         opt_map = {}
         val_map = {}
 
-        for prefix, node, children in self.root.collect_structure():
-            if len(prefix) == 0:
-                all_cmds.update(children)
-            else:
-                pfx = "_".join(prefix).replace('-', '_')
-                if children:
-                    subcmds_map[pfx] = sorted(children)
+        for prefix, node, children in self.root.walk():
+            if not prefix:
+                all_cmds.update(child.name for child in children)
+                continue
+            label = "_".join(prefix).translate(_LABEL_TRANS)
+            if children:
+                subcmds_map[label] = sorted(child.name for child in children)
+            if node.func is not None:
+                nodes[label] = (prefix, node)
 
         for label, (prefix, node) in nodes.items():
-            opt_map.setdefault(label, [])
-            if node.signature is not None:
-                for p in node.signature.parameters.values():
-                    opt = f"--{p.name}"
-                    if opt not in opt_map[label]:
-                        opt_map[label].append(opt)
+            opts = opt_map.setdefault(label, {})
+            plan = node.ensure_plan()
+            if plan:
+                for pname, _required, _default in plan:
+                    opts[f"--{pname}"] = None
             if node.completion:
                 val_map.setdefault(label, {})
                 for arg, vals in node.completion.items():
-                    if f"--{arg}" not in opt_map[label]:
-                        opt_map[label].append(f"--{arg}")
+                    opts[f"--{arg}"] = None
                     val_map[label][arg] = vals
 
         arrays = []
         for label, argvals in val_map.items():
             for arg, vals in argvals.items():
-                basharr = f"_COMP_{label}__{arg}"
                 valstr = " ".join([f'"{v}"' for v in vals])
-                arrays.append(f'{basharr}=({valstr})')
+                arrays.append(_ARRAY_LINE % (label, arg, valstr))
 
         script = [
             "#!/bin/bash",
             *arrays,
             "",
             f'_{self.name}_completion() {{',
-            '    local cur prev words cword',
-            '    COMPREPLY=()',
-            '    cur="${COMP_WORDS[COMP_CWORD]}"',
-            '    prev="${COMP_WORDS[COMP_CWORD-1]}"',
-            '    words=("${COMP_WORDS[@]}")',
-            '    cword=$COMP_CWORD',
+            _COMPLETION_PRELUDE,
             '',
             f'    cmds="{ " ".join(sorted(all_cmds)) }"',
             '',
             '    declare -A subcmds',
         ]
         for k, subs in subcmds_map.items():
-            script.append(f'    subcmds["{k}"]="{ " ".join(subs) }"')
+            script.append(_SUBCMDS_LINE % (k, " ".join(subs)))
         script.append('    declare -A opts')
         for label, optlist in opt_map.items():
-            script.append(f'    opts["{label}"]="{ " ".join(optlist) }"')
+            script.append(_OPTS_LINE % (label, " ".join(optlist)))
         script.append('    declare -A vals')
         for label, argvals in val_map.items():
             for arg, vals_ in argvals.items():
-                basharr = f'_COMP_{label}__{arg}'
-                script.append(f'    vals["{label}__{arg}"]="{ " ".join(vals_) }"')
+                script.append(_VALS_LINE % (label, arg, " ".join(vals_)))
 
-        script.extend([
-            '',
-            '    find_cmd_label() {',
-            '        local idx=1',
-            '        local curr_label=""',
-            '        local last_label=""',
-            '        while ((idx < cword)); do',
-            '            local arg="${words[idx]}"',
-            '            [[ "$arg" == --* ]] && break',
-            '            if [[ -z "$curr_label" ]]; then',
-            '                curr_label="$arg"',
-            '            else',
-            '                curr_label="${curr_label}_$arg"',
-            '            fi',
-            '            local normalized_curr_label="${curr_label//-/_}"',
-            '            if [[ -n "${subcmds[$normalized_curr_label]}" ]]; then',
-            '                last_label="$normalized_curr_label"',
-            '            else',
-            '                last_label="$normalized_curr_label"',
-            '                break',
-            '            fi',
-            '            ((idx++))',
-            '        done',
-            '        echo "$last_label $idx"',
-            '    }',
-            '',
-            '    if [[ $cword -eq 1 ]]; then',
-            '        COMPREPLY=( $(compgen -W "$cmds" -- "$cur") )',
-            '        return 0',
-            '    fi',
-            '',
-            '    read sub_label argstart <<<"$(find_cmd_label)"',
-            '',
-            '    if [[ -z "$sub_label" ]]; then',
-            '        sub_label="${words[1]//-/_}"',
-            '        argstart=2',
-            '    fi',
-            '',
-            '    already_set_opts=()',
-            '    idx=$argstart',
-            '    while ((idx < cword)); do',
-            '        word="${words[idx]}"',
-            '        if [[ "$word" == --* ]]; then',
-            '            argn="${word%%=*}"',
-            '            argn="${argn#--}"',
-            '            already_set_opts+=("$argn")',
-            '            if [[ "$word" != *=* ]]; then',
-            '                if ((idx + 1 < cword)); then',
-            '                    nextw="${words[idx+1]}"',
-            '                    if [[ ! "$nextw" == --* ]]; then',
-            '                        ((idx++))',
-            '                    fi',
-            '                fi',
-            '            fi',
-            '        fi',
-            '        ((idx++))',
-            '    done',
-            '',
-            '    remaining_opts=()',
-            '    for opt in ${opts[$sub_label]}; do',
-            '        o="${opt#--}"',
-            '        skip=0',
-            '        for ao in "${already_set_opts[@]}"; do',
-            '            [[ "$o" == "$ao" ]] && skip=1 && break',
-            '        done',
-            '        [[ $skip -eq 0 ]] && remaining_opts+=("$opt")',
-            '    done',
-            '',
-            '    if [[ -n "${subcmds[$sub_label]}" && $cword -eq $argstart ]]; then',
-            '        present=0',
-            '        for sub in ${subcmds[$sub_label]}; do',
-            '            if [[ "${words[argstart]}" == "$sub" ]]; then',
-            '                present=1',
-            '            fi',
-            '        done',
-            '        if [[ $present -eq 0 ]]; then',
-            '            COMPREPLY=( $(compgen -W "${subcmds[$sub_label]}" -- "$cur") )',
-            '            return 0',
-            '        fi',
-            '    fi',
-            '',
-            '    if [[ "$prev" == --* ]]; then',
-            '        argname="${prev#--}"',
-            '        if [[ -n "${vals[${sub_label}__${argname}]}" ]]; then',
-            '            COMPREPLY=( $(compgen -W "${vals[${sub_label}__${argname}]}" -- "$cur") )',
-            '            return 0',
-            '        fi',
-            '    fi',
-            '',
-            '    if [[ "$cur" == --*=* ]]; then',
-            '        argname="${cur%%=*}"',
-            '        argname="${argname#--}"',
-            '        val_primary="${cur#*=}"',
-            '        if [[ -n "${vals[${sub_label}__${argname}]}" ]]; then',
-            '            COMPREPLY=( $(compgen -W "${vals[${sub_label}__${argname}]}" -- "$val_primary") )',
-            '            return 0',
-            '        fi',
-            '    fi',
-            '',
-            '    if ((cword>=2)); then',
-            '        prev2="${COMP_WORDS[COMP_CWORD-2]}"',
-            '        if [[ "$prev2" == --* ]]; then',
-            '            argname="${prev2#--}"',
-            '            if [[ -n "${vals[${sub_label}__${argname}]}" ]]; then',
-            '                if ((${#remaining_opts[@]})); then',
-            '                    COMPREPLY=( $(compgen -W "${remaining_opts[*]}" -- "$cur") )',
-            '                    return 0',
-            '                fi',
-            '            fi',
-            '        fi',
-            '    fi',
-            '',
-            '    if [[ -z "${subcmds[$sub_label]}" && ${#remaining_opts[@]} -gt 0 ]]; then',
-            '        COMPREPLY=( $(compgen -W "${remaining_opts[*]}" -- "$cur") )',
-            '        return 0',
-            '    fi',
-            '',
-            '    if [[ ${#remaining_opts[@]} -gt 0 ]]; then',
-            '        COMPREPLY+=( $(compgen -W "${remaining_opts[*]}" -- "$cur") )',
-            '    fi',
-            '',
-            '    return 0',
-            '}',
-            f'complete -F _{self.name}_completion {self.name}'
-        ])
-        print('\n'.join(script))
+        script.append(_COMPLETION_BODY)
+        script.append(f'complete -F _{self.name}_completion {self.name}')
+        return '\n'.join(script)